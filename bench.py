@@ -0,0 +1,277 @@
+# bench.py - offline end-to-end benchmark for process_archive
+# Runs the real pipeline against a fake Telegram client, no accounts needed:
+#   python3 bench.py --scale 0.1 --latency 0.05 --bandwidth 50
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+
+import psutil
+
+os.environ.setdefault("API_ID", "1")  # bot.py reads its config on import
+os.environ.setdefault("API_HASH", "bench")
+import bot  # noqa: E402
+
+
+# ============================= FAKE TELEGRAM =============================
+class FakeMessage:
+    """Status/reply message: edits and replies only cost the simulated latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def edit(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+
+    async def reply(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return FakeMessage(self.latency)
+
+
+class FakeClient:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_file(self, chat_id, file, caption=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += len(file) if isinstance(file, list) else 1
+
+
+def fake_event(archive: str, latency: float):
+    """Looks enough like a NewMessage event for process_archive"""
+    size = os.path.getsize(archive)
+    event = FakeMessage(latency)
+    event.chat_id = 1
+    event.sender_id = 1
+    event.file = SimpleNamespace(name=os.path.basename(archive), size=size)
+    event.message = SimpleNamespace(source=archive, document=SimpleNamespace(size=size))
+    return event
+
+
+def fake_transfers(latency: float, bandwidth: float):
+    """Stand-ins for transfer_download/transfer_upload with latency + bandwidth"""
+    chunk_size = 512 * 1024
+
+    async def download(client, message, path, progress_callback=None):
+        size = message.document.size
+        await asyncio.sleep(latency)
+        with open(message.source, "rb") as src, open(path, "wb") as out:
+            while chunk := src.read(chunk_size):
+                out.write(chunk)
+                await asyncio.sleep(len(chunk) / bandwidth)
+                if progress_callback:
+                    await progress_callback(out.tell(), size)
+        return path
+
+    async def upload(client, path):
+        await asyncio.sleep(latency + os.path.getsize(path) / bandwidth)
+        return f"uploaded:{os.path.basename(path)}"
+
+    return download, upload
+
+
+# ============================= CORPORA =============================
+def _random_file(path: str, size: int) -> None:
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(os.urandom(min(size, 1024 * 1024)))
+            size -= 1024 * 1024
+
+
+def _muted_video(path: str, seconds: int) -> None:
+    if shutil.which("ffmpeg"):
+        subprocess.run(
+            ["ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=640x360"]
+            + ["-pix_fmt", "yuv420p", "-an", path],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    else:
+        _random_file(path, 256 * 1024)  # Probing fails fast, the fallback path is timed
+
+
+def build_corpus(name: str, workdir: str, scale: float) -> str:
+    """Create the archive for a scenario and return its path"""
+    src = os.path.join(workdir, f"{name}_src")
+    os.makedirs(src, exist_ok=True)
+
+    if name == "tiny":
+        for i in range(max(1, int(2000 * scale))):
+            _random_file(os.path.join(src, f"note_{i:05}.txt"), 1024)
+        archive = os.path.join(workdir, "tiny.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+            for f in sorted(os.listdir(src)):
+                z.write(os.path.join(src, f), f)
+    elif name == "huge":
+        for i in range(3):
+            _random_file(os.path.join(src, f"blob_{i}.bin"), int(512 * 1024**2 * scale))
+        archive = os.path.join(workdir, "huge.tar")
+        with tarfile.open(archive, "w") as t:
+            t.add(src, arcname="huge")
+    elif name == "mixed":
+        for i in range(max(1, int(40 * scale))):
+            _random_file(os.path.join(src, f"photo_{i}.jpg"), 300 * 1024)
+            _random_file(os.path.join(src, f"scan_{i}.pdf"), 100 * 1024)
+            _random_file(os.path.join(src, f"readme_{i}.txt"), 4 * 1024)
+        for i in range(max(1, int(5 * scale))):
+            _muted_video(os.path.join(src, f"clip_{i}.mp4"), 2)
+        import py7zr
+
+        archive = os.path.join(workdir, "mixed.7z")
+        with py7zr.SevenZipFile(archive, "w") as z:
+            z.writeall(src, "mixed")
+    elif name == "muted":
+        for i in range(max(1, int(20 * scale))):
+            _muted_video(os.path.join(src, f"muted_{i}.mp4"), 3)
+        archive = os.path.join(workdir, "muted.zip")
+        with zipfile.ZipFile(archive, "w") as z:
+            for f in sorted(os.listdir(src)):
+                z.write(os.path.join(src, f), f)
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+
+    shutil.rmtree(src)
+    return archive
+
+
+# ============================= MEASUREMENTS =============================
+def _disk_usage(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass  # Removed while walking
+    return total
+
+
+class Sampler(threading.Thread):
+    """Samples RSS and disk use from a thread so the loop under test isn't touched"""
+
+    def __init__(self, watch_dir: str, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.watch_dir = watch_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        process = psutil.Process()
+        while not self._done.is_set():
+            self.peak_rss = max(self.peak_rss, process.memory_info().rss)
+            self.peak_disk = max(self.peak_disk, _disk_usage(self.watch_dir))
+            self._done.wait(self.interval)
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+async def loop_lag(samples: list[float], interval: float = 0.01) -> None:
+    """How late the loop wakes up a sleeping task, collected until cancelled"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+# ============================= RUN =============================
+async def run_scenario(name: str, args) -> dict:
+    archive = build_corpus(name, args.workdir, args.scale)
+    archive_size = os.path.getsize(archive)
+    latency, bandwidth = args.latency, args.bandwidth * 1024**2
+
+    fake = FakeClient(latency)
+    bot.client = fake
+    bot.upload_pool[:] = [
+        {"client": fake, "name": f"fake#{i}", "busy": 0, "flood_until": 0.0}
+        for i in range(args.sessions)
+    ]
+    bot.transfer_download, bot.transfer_upload = fake_transfers(latency, bandwidth)
+
+    event = fake_event(archive, latency)
+    task_data = {
+        "event": event,
+        "status": FakeMessage(latency),
+        "user_id": 1,
+        "cancelled": False,
+        "queued_at": time.monotonic(),
+    }
+
+    lags: list[float] = []
+    lag_task = asyncio.create_task(loop_lag(lags))
+    sampler = Sampler(os.path.join(args.workdir, "downloads"))
+    sampler.start()
+    started = time.perf_counter()
+    await bot.process_archive(task_data)
+    elapsed = time.perf_counter() - started
+    sampler.stop()
+    lag_task.cancel()
+    os.remove(archive)
+
+    lags.sort()
+    return {
+        "scenario": name,
+        "archive_mb": archive_size / 1024**2,
+        "seconds": elapsed,
+        "mb_s": archive_size / 1024**2 / elapsed,
+        "files_s": fake.sent / elapsed,
+        "peak_rss_mb": sampler.peak_rss / 1024**2,
+        "peak_disk_mb": sampler.peak_disk / 1024**2,
+        "lag_p99_ms": lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+        "lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+def print_results(results: list[dict]) -> None:
+    header = (
+        f"{'scenario':<8} {'size MB':>8} {'sec':>8} {'MB/s':>8} {'files/s':>8} "
+        f"{'RSS MB':>8} {'disk MB':>8} {'lag p99':>8} {'lag max':>8}"
+    )
+    print(header)
+    print("─" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<8} {r['archive_mb']:>8.1f} {r['seconds']:>8.2f} "
+            f"{r['mb_s']:>8.1f} {r['files_s']:>8.1f} {r['peak_rss_mb']:>8.1f} "
+            f"{r['peak_disk_mb']:>8.1f} {r['lag_p99_ms']:>6.1f}ms {r['lag_max_ms']:>6.1f}ms"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline process_archive benchmark")
+    parser.add_argument(
+        "scenarios", nargs="*", default=["tiny", "huge", "mixed", "muted"]
+    )
+    parser.add_argument("--scale", type=float, default=0.1, help="corpus size factor")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+    parser.add_argument("--bandwidth", type=float, default=50, help="MB/s per transfer")
+    parser.add_argument("--sessions", type=int, default=1, help="fake upload sessions")
+    args = parser.parse_args()
+
+    bot.logger.setLevel(logging.WARNING)  # Per-file INFO lines would drown the table
+    args.workdir = tempfile.mkdtemp(prefix="unzipbot_bench_")
+    os.chdir(args.workdir)  # process_archive works below ./downloads
+    try:
+        results = [await run_scenario(name, args) for name in args.scenarios]
+    finally:
+        os.chdir("/")
+        shutil.rmtree(args.workdir, ignore_errors=True)
+    print_results(results)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
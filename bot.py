@@ -1,32 +1,63 @@
 # bot.py - PREMIUM UNZIP BOT by @hellopeter3
 import asyncio
+import atexit
+import bisect
+import hashlib
+import io
 import json
 import logging
+import math
 import mimetypes
 import os
+import queue
 import shutil
+import socket
+import sqlite3
 import subprocess
+import sys
+import tarfile
+import threading
+import time
+import traceback
+import zipfile
 import re  # For manual pattern matching in callbacks
+from collections import Counter, defaultdict
+from contextlib import closing, contextmanager
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from types import SimpleNamespace
 from dotenv import load_dotenv
-from telethon import Button, TelegramClient, events
+from telethon import Button, TelegramClient, events, helpers, utils
+from telethon.errors import FloodWaitError
 from telethon.sessions import StringSession
-from telethon.tl.types import DocumentAttributeVideo, InputMediaUploadedDocument
-from FastTelethonhelper import fast_download, fast_upload
+from telethon.tl import types as tl_types
+from telethon.tl.types import (
+    DocumentAttributeVideo,
+    InputFile,
+    InputFileBig,
+    InputMediaUploadedDocument,
+)
+from FastTelethonhelper.FastTelethon import ParallelTransferrer
 
 load_dotenv()
 # ============================= LOGS =============================
 os.makedirs("logs", exist_ok=True)
+# Records are formatted by the QueueHandler, the writes happen on the listener thread
+log_queue = queue.SimpleQueue()
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s | %(levelname)s | %(message)s",
-    handlers=[
-        logging.FileHandler(
-            f"logs/bot_{datetime.now().strftime('%Y-%m-%d')}.log", encoding="utf-8"
-        ),
-        logging.StreamHandler(),
-    ],
+    handlers=[QueueHandler(log_queue)],
+)
+log_listener = QueueListener(
+    log_queue,
+    logging.FileHandler(
+        f"logs/bot_{datetime.now().strftime('%Y-%m-%d')}.log", encoding="utf-8"
+    ),
+    logging.StreamHandler(),
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger("PremiumBot")
 logger.info("════════════════════════════════════")
 logger.info(" PREMIUM UNZIP BOT STARTED - @hellopeter3")
@@ -48,9 +79,31 @@ API_HASH = os.getenv("API_HASH")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 DEVELOPER = "hellopeter3"
 start_time = datetime.now()
+# all = one process does everything, frontend = only talks to users, worker = only jobs
+BOT_MODE = os.getenv("BOT_MODE", "all")
 client = TelegramClient(
-    StringSession(os.getenv("SESSION_STRING", "")), API_ID, API_HASH
+    StringSession(os.getenv("SESSION_STRING", "")),
+    API_ID,
+    API_HASH,
+    receive_updates=BOT_MODE != "worker",  # Workers share the token but not the chat
 )
+ARCHIVE_EXTS = (".zip", ".rar", ".7z", ".tar", ".gz", ".tgz", ".bz2")
+NESTED_DEPTH = int(os.getenv("NESTED_DEPTH", "0"))  # 0 = leave inner archives as files
+MAX_EXTRACT_FILES = int(os.getenv("MAX_EXTRACT_FILES", "10000"))
+MAX_EXTRACT_BYTES = int(os.getenv("MAX_EXTRACT_BYTES", str(20 * 1024**3)))
+# Extra sessions to upload with, comma separated; they post to STORAGE_CHAT
+UPLOAD_SESSIONS = [s for s in os.getenv("UPLOAD_SESSIONS", "").split(",") if s.strip()]
+STORAGE_CHAT = os.getenv("STORAGE_CHAT", "")
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "20"))  # Per file transfer
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no metrics endpoint
+ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").split(",") if i.strip()}
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.5"))  # 0 = no watchdog
+BROKER_URL = os.getenv("BROKER_URL", "sqlite:///jobs.db")  # Or redis://host:6379/0
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+WORKER_TIMEOUT = float(os.getenv("WORKER_TIMEOUT", "120"))  # Seconds without heartbeat
+VOLUME_DOWNLOADS = int(os.getenv("VOLUME_DOWNLOADS", "2"))  # Parts downloading at once
+VOLUME_IDLE_TIMEOUT = int(os.getenv("VOLUME_IDLE_TIMEOUT", "1800"))  # Drop unfinished sets
 # ============================= GLOBALS =============================
 user_passwords: dict[int, bytes] = {}
 pending_tasks: dict[int, bool] = {}
@@ -58,6 +111,7 @@ active_uploads: dict[int, int] = {}
 user_in_queue: set[int] = set()  # Fast check for users in queue (prevents multi-add)
 cancelled_users: set[int] = set()  # Renamed for clarity
 user_task_data: dict[int, dict] = {}  # Store task reference per user
+volume_sets: dict[int, dict] = {}  # Split archive being collected per user
 # cancelled_tasks: set[int] = set()  # Track cancelled task IDs to skip in queue
 
 
@@ -73,28 +127,197 @@ queue_list = []  # Track queue for status display
 is_processing = False
 current_user = None
 current_archive = None  # Track current processing archive name
+cancel_requested: dict[int, float] = {}  # When the user pressed cancel
+
+
+# ============================= METRICS =============================
+METRIC_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+counters: dict[tuple[str, str], float] = defaultdict(float)  # (name, phase) -> total
+histograms: dict[tuple[str, str], dict] = {}  # (name, phase) -> buckets/sum/count
+
+
+def inc(name: str, value: float = 1, phase: str = "") -> None:
+    counters[(name, phase)] += value
+
+
+def observe(name: str, seconds: float, phase: str = "") -> None:
+    h = histograms.setdefault(
+        (name, phase), {"buckets": [0] * len(METRIC_BUCKETS), "sum": 0.0, "count": 0}
+    )
+    for i, bound in enumerate(METRIC_BUCKETS):
+        if seconds <= bound:
+            h["buckets"][i] += 1
+    h["sum"] += seconds
+    h["count"] += 1
+
+
+@contextmanager
+def timed(phase: str):
+    """Record how long a block of a job phase took, even if it fails"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe("phase_seconds", time.monotonic() - started, phase)
+
+
+class FloodWaitCounter(logging.Handler):
+    """Counts the FloodWaits Telethon sleeps through itself (up to flood_sleep_threshold)"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Telethon logs "Sleeping[ early] for %ds (%s) on %s flood wait" before sleeping
+        if str(record.msg).startswith("Sleeping") and str(record.msg).endswith("flood wait"):
+            inc("floodwait_seconds_total", record.args[1])
+
+
+logging.getLogger("telethon.client.users").addHandler(FloodWaitCounter())
+
+
+def render_metrics() -> str:
+    """Counters and histograms in the Prometheus text format"""
+    def labels(phase: str, extra: str = "") -> str:
+        parts = [p for p in (f'phase="{phase}"' if phase else "", extra) if p]
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    lines = []
+    for name in sorted({n for n, _ in counters}):
+        lines.append(f"# TYPE unzipbot_{name} counter")
+        for (n, phase), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"unzipbot_{name}{labels(phase)} {value:g}")
+    for name in sorted({n for n, _ in histograms}):
+        lines.append(f"# TYPE unzipbot_{name} histogram")
+        for (n, phase), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            bounds = [*METRIC_BUCKETS, "+Inf"]
+            for bound, count in zip(bounds, [*h["buckets"], h["count"]]):
+                le = f'le="{bound}"'
+                lines.append(f"unzipbot_{name}_bucket{labels(phase, le)} {count}")
+            lines.append(f"unzipbot_{name}_sum{labels(phase)} {h['sum']:.6f}")
+            lines.append(f"unzipbot_{name}_count{labels(phase)} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(reader, writer) -> None:
+    """Answer any HTTP request with the current metrics"""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = render_metrics().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+# ============================= LOOP MONITOR & PROFILER =============================
+HEARTBEAT_INTERVAL = 0.1
+loop_state = {"beat": time.monotonic(), "thread": None}  # Last wake-up, loop thread id
+
+
+async def loop_heartbeat() -> None:
+    """Wake up regularly; how late each wake-up is, is the loop lag"""
+    loop_state["thread"] = threading.get_ident()
+    while True:
+        started = time.monotonic()
+        loop_state["beat"] = started
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lag = time.monotonic() - started - HEARTBEAT_INTERVAL
+        observe("loop_lag_seconds", max(0.0, lag))
+
+
+def _loop_watchdog(threshold: float) -> None:
+    """Thread: log what the loop is running when it misses its heartbeat"""
+    reported = None
+    while True:
+        time.sleep(threshold / 2)
+        beat = loop_state["beat"]
+        stalled = time.monotonic() - beat - HEARTBEAT_INTERVAL
+        if stalled < threshold or reported == beat:
+            continue
+        reported = beat  # Once per stall
+        frame = sys._current_frames().get(loop_state["thread"])
+        stack = "".join(traceback.format_stack(frame)) if frame else "unknown\n"
+        logger.warning(
+            f"{c.R}Event loop blocked for {stalled:.2f}s in:{c.E}\n{stack.rstrip()}"
+        )
+
+
+def start_loop_monitor() -> None:
+    asyncio.create_task(loop_heartbeat())
+    if LOOP_LAG_THRESHOLD > 0:
+        threading.Thread(
+            target=_loop_watchdog, args=(LOOP_LAG_THRESHOLD,), daemon=True
+        ).start()
+
+
+def sample_loop_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """Thread: collect the loop thread's stacks as `outer;...;inner` strings"""
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(loop_state["thread"])
+        if frame:
+            names = [
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                for code in (f.f_code for f, _ in traceback.walk_stack(frame))
+            ]
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def write_profile(stacks: Counter, seconds: float) -> str:
+    """Top functions plus folded stacks (flamegraph.pl / speedscope input)"""
+    total = sum(stacks.values()) or 1
+    own, inclusive = Counter(), Counter()
+    for stack, count in stacks.items():
+        names = stack.split(";")
+        own[names[-1]] += count
+        for name in set(names):
+            inclusive[name] += count
+
+    path = f"logs/profile_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {total} samples over {seconds:g}s of the event loop thread\n\n")
+        for title, counts in (("Own time", own), ("Including callees", inclusive)):
+            f.write(f"## {title}\n")
+            for name, count in counts.most_common(25):
+                f.write(f"{count / total * 100:6.1f}%  {name}\n")
+            f.write("\n")
+        f.write("## Folded stacks\n")
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
 
 
 # ============================= MUTED VIDEO FIX =============================
 def video_has_audio(path: str) -> bool:
     try:
-        result = subprocess.run(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-select_streams",
-                "a",
-                "-show_entries",
-                "stream=index",
-                "-of",
-                "json",
-                path,
-            ],
-            capture_output=True,
-            text=True,
-            timeout=15,
-        )
+        with timed("probe"):
+            result = subprocess.run(
+                [
+                    "ffprobe",
+                    "-v",
+                    "error",
+                    "-select_streams",
+                    "a",
+                    "-show_entries",
+                    "stream=index",
+                    "-of",
+                    "json",
+                    path,
+                ],
+                capture_output=True,
+                text=True,
+                timeout=15,
+            )
         return len(json.loads(result.stdout).get("streams", [])) > 0
     except Exception:
         return True
@@ -108,42 +331,261 @@ def add_silent_audio(path: str, muted_list: list[str]) -> None:
     logger.info(f"{c.Y}Silent video detected → Added silent track: {name}{c.E}")
     muted_list.append(name)  # Collect for final summary
     temp = path + ".silent_fixed.mp4"
-    subprocess.run(
-        [
-            "ffmpeg",
-            "-y",
-            "-i",
-            path,
-            "-f",
-            "lavfi",
-            "-i",
-            "anullsrc=channel_layout=stereo:sample_rate=48000",
-            "-c:v",
-            "copy",
-            "-c:a",
-            "aac",
-            "-shortest",
-            temp,
-        ],
-        check=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
+    with timed("ffmpeg"):
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-y",
+                "-i",
+                path,
+                "-f",
+                "lavfi",
+                "-i",
+                "anullsrc=channel_layout=stereo:sample_rate=48000",
+                "-c:v",
+                "copy",
+                "-c:a",
+                "aac",
+                "-shortest",
+                temp,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
     os.replace(temp, path)
 
 
+def video_attributes(path: str) -> list | None:
+    """Video attributes for Telegram, None if ffprobe can't read the file"""
+    try:
+        with timed("probe"):
+            meta = json.loads(
+                subprocess.run(
+                    [
+                        "ffprobe",
+                        "-v",
+                        "error",
+                        "-select_streams",
+                        "v",
+                        "-show_entries",
+                        "stream=width,height,duration",
+                        "-of",
+                        "json",
+                        path,
+                    ],
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            )["streams"][0]
+        return [
+            DocumentAttributeVideo(
+                duration=int(float(meta.get("duration", 0))),
+                w=int(meta.get("width", 0)),
+                h=int(meta.get("height", 0)),
+                supports_streaming=True,
+            )
+        ]
+    except Exception as e:
+        logger.error(f"Video metadata error for {os.path.basename(path)}: {e}")
+        return None
+
+
+# ============================= NESTED ARCHIVES =============================
+class ExtractLimitExceeded(Exception):
+    """Raised when an archive (including nested ones) exceeds the bomb limits"""
+
+
+def archive_kind(name: str) -> str | None:
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        return "zip"
+    if lower.endswith(".7z"):
+        return "7z"
+    if lower.endswith(".rar"):
+        return "rar"
+    if lower.endswith((".tar", ".gz", ".tgz", ".bz2")):
+        return "tar"
+    return None
+
+
+def _charge(budget: dict, files: int = 0, size: int = 0) -> None:
+    """Count extracted files/bytes against the limits shared by all levels"""
+    budget["files"] += files
+    budget["bytes"] += size
+    if budget["files"] > MAX_EXTRACT_FILES:
+        raise ExtractLimitExceeded(f"Too many files (>{MAX_EXTRACT_FILES:,})")
+    if budget["bytes"] > MAX_EXTRACT_BYTES:
+        raise ExtractLimitExceeded(f"Too much data (>{MAX_EXTRACT_BYTES:,} bytes)")
+
+
+def _safe_join(root: str, member: str) -> str | None:
+    """Resolve an archive member below root, None if it would escape it"""
+    root = os.path.realpath(root)
+    dest = os.path.realpath(os.path.join(root, member))
+    return dest if dest.startswith(root + os.sep) else None
+
+
+def _seekable(stream) -> bool:
+    try:
+        return stream.seekable()
+    except Exception:  # members of streamed tars raise instead of answering False
+        return False
+
+
+def _iter_members(src, kind: str, password: bytes | None):
+    """Yield (name, stream) for every regular file of a zip/tar, without extracting"""
+    if kind == "zip":
+        from pyzipper import AESZipFile
+
+        with AESZipFile(src) if password else zipfile.ZipFile(src) as z:
+            if isinstance(src, VolumeReader):
+                _rebase_spanned_zip(z, src.starts)
+            for info in z.infolist():
+                if info.is_dir():
+                    continue
+                with z.open(info, pwd=password) as stream:
+                    yield info.filename, stream
+        return
+
+    if isinstance(src, str):
+        t = tarfile.open(src)
+    else:
+        # Streams (inner tars, joined volumes) are read without seeking
+        t = tarfile.open(fileobj=src, mode="r|*")
+    with t:
+        for member in t:
+            if member.isfile():
+                yield member.name, t.extractfile(member)
+
+
+def expand_archive(
+    src, kind: str, extract_to: str, password: bytes | None, depth: int, budget: dict
+) -> None:
+    """Extract src (path or stream) and open inner archives up to `depth` levels"""
+    if kind in {"7z", "rar"}:
+        # No member streams here: check declared sizes, extract, then recurse on disk
+        import py7zr, rarfile
+
+        pwd = password.decode() if password else None
+        if kind == "7z":
+            with py7zr.SevenZipFile(src, password=pwd) as z:
+                infos = [i for i in z.list() if not i.is_directory]
+                _charge(budget, len(infos), sum(i.uncompressed or 0 for i in infos))
+                z.extractall(extract_to)
+        else:
+            with rarfile.RarFile(src) as r:
+                infos = [i for i in r.infolist() if not i.is_dir()]
+                _charge(budget, len(infos), sum(i.file_size for i in infos))
+                r.extractall(extract_to, pwd=pwd)
+        if depth > 0:
+            for root, _, filenames in os.walk(extract_to):
+                for filename in filenames:
+                    inner_kind = archive_kind(filename)
+                    if inner_kind:
+                        fp = os.path.join(root, filename)
+                        with open(fp, "rb") as f:
+                            if _expand_inner(f, inner_kind, fp, password, depth, budget):
+                                os.remove(fp)
+        return
+
+    os.makedirs(extract_to, exist_ok=True)
+    for name, stream in _iter_members(src, kind, password):
+        dest = _safe_join(extract_to, name)
+        if dest is None:
+            logger.warning(f"Skipping unsafe path in archive: {name}")
+            continue
+        _charge(budget, files=1)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+        inner_kind = archive_kind(name) if depth > 0 else None
+        if inner_kind and _expand_inner(stream, inner_kind, dest, password, depth, budget):
+            continue
+
+        with open(dest, "wb") as out:
+            while chunk := stream.read(1024 * 1024):
+                _charge(budget, size=len(chunk))
+                out.write(chunk)
+
+
+class _TeeReader(io.RawIOBase):
+    """Reads through to a stream and keeps a copy of every byte read"""
+
+    def __init__(self, stream, copy):
+        self.stream = stream
+        self.copy = copy
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        self.copy.write(data)
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _expand_inner(
+    stream, kind: str, dest: str, password: bytes | None, depth: int, budget: dict
+) -> bool:
+    """Expand an inner archive next to where it would be written, False to keep it as a file"""
+    if kind != "tar" and not _seekable(stream):
+        # zip/7z/rar need random access; members of streamed tars don't have it
+        logger.info(f"Keeping nested {os.path.basename(dest)} (stream not seekable)")
+        return False
+    target = dest + "_extracted"
+    copy = None
+    src = stream
+    if not _seekable(stream):
+        # Can't rewind if it turns out not to be a tar, so keep what was read
+        copy = open(dest, "wb")
+        src = _TeeReader(stream, copy)
+    try:
+        expand_archive(src, kind, target, password, depth - 1, budget)
+    except ExtractLimitExceeded:
+        if copy:
+            copy.close()
+            os.remove(dest)
+        raise
+    except Exception as e:
+        logger.warning(f"Nested archive {os.path.basename(dest)} not expanded: {e}")
+        shutil.rmtree(target, ignore_errors=True)
+        if not copy:
+            stream.seek(0)
+            return False
+        with copy:
+            while chunk := stream.read(1024 * 1024):
+                copy.write(chunk)
+        _charge(budget, size=os.path.getsize(dest))
+        return True  # Written unchanged from the copy
+    if copy:
+        copy.close()
+        os.remove(dest)
+    logger.info(f"Expanded nested {kind} → {os.path.basename(dest)}")
+    return True
+
+
 # ============================= EXTRACT ARCHIVE =============================
 def extract_archive(
-    file_path: str, extract_to: str, password: bytes | None = None
+    file_path: str, extract_to: str, password: bytes | None = None, depth: int = 0
 ) -> str:
     try:
-        import py7zr, rarfile, tarfile, zipfile
+        import py7zr, rarfile
         from pyzipper import AESZipFile
 
         ext = os.path.splitext(file_path)[1].lower()
         logger.info(
             f"Extracting {os.path.basename(file_path)} → {ext} (pwd: {'Yes' if password else 'No'})"
         )
+        if depth > 0 and archive_kind(file_path):
+            budget = {"files": 0, "bytes": 0}
+            expand_archive(
+                file_path, archive_kind(file_path), extract_to, password, depth, budget
+            )
+            logger.info(
+                f"Extraction successful ({budget['files']:,} files, {budget['bytes']:,} bytes)"
+            )
+            return "success"
         if ext == ".zip":
             with AESZipFile(file_path) if password else zipfile.ZipFile(file_path) as z:
                 z.extractall(extract_to, pwd=password)
@@ -170,9 +612,126 @@ def extract_archive(
         return str(e)
 
 
+# ============================= MULTI-VOLUME ARCHIVES =============================
+LAST_VOLUME = 10_000  # Sort key of the closing `.zip` of a `.z01` set
+VOLUME_PATTERNS = (
+    (re.compile(r"^(.+)\.part(\d+)\.rar$", re.I), "rar"),  # movie.part1.rar
+    (re.compile(r"^(.+\.(?:zip|7z|rar|tar|gz|tgz|bz2))\.(\d{3})$", re.I), "split"),
+    (re.compile(r"^(.+)\.z(\d{2})$", re.I), "zip"),  # movie.z01 … movie.zip
+)
+
+
+def volume_info(name: str) -> tuple[str, str, int] | None:
+    """(base, kind, index) if the filename is one volume of a split archive"""
+    for pattern, kind in VOLUME_PATTERNS:
+        match = pattern.match(name)
+        if match:
+            return match.group(1), kind, int(match.group(2))
+    return None
+
+
+class VolumeReader(io.RawIOBase):
+    """Read-only seekable stream over all volumes, as if they were one file"""
+
+    def __init__(self, paths: list[str]):
+        self.paths = paths
+        self.starts = []
+        self.size = 0
+        for p in paths:
+            self.starts.append(self.size)
+            self.size += os.path.getsize(p)
+        self.pos = 0
+        self._files = {}
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def readinto(self, b) -> int:
+        # Fill the whole buffer, crossing volume boundaries as needed
+        view = memoryview(b)
+        n = 0
+        while n < len(view) and self.pos < self.size:
+            i = bisect.bisect_right(self.starts, self.pos) - 1
+            if i not in self._files:
+                self._files[i] = open(self.paths[i], "rb")
+            f = self._files[i]
+            f.seek(self.pos - self.starts[i])
+            got = f.readinto(view[n:])
+            if not got:
+                break
+            n += got
+            self.pos += got
+        return n
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+def _rebase_spanned_zip(z: zipfile.ZipFile, starts: list[int]) -> None:
+    """Point entries of a spanned zip (.z01 … .zip) at offsets in the joined stream"""
+    # Offsets are relative to each entry's own volume; zipfile shifted them all by
+    # the start of the volume holding the central directory
+    endrec = zipfile._EndRecData(z.fp)
+    shift = starts[endrec[zipfile._ECD_DISK_START]]
+    for info in z.infolist():
+        info.header_offset += starts[info.volume] - shift
+        if hasattr(info, "_end_offset"):
+            info._end_offset = None  # overlap check used the unadjusted offsets
+
+
+def extract_volumes(
+    volume_set: dict, extract_to: str, password: bytes | None = None, depth: int = 0
+) -> str:
+    paths = [volume_set["paths"][i] for i in sorted(volume_set["paths"])]
+    base, kind = volume_set["base"], volume_set["kind"]
+    logger.info(
+        f"Extracting {len(paths)} volumes of {base} → {kind} (pwd: {'Yes' if password else 'No'})"
+    )
+    budget = {"files": 0, "bytes": 0}
+    try:
+        if kind == "rar":
+            # unrar picks up the following volumes next to the first one
+            expand_archive(paths[0], "rar", extract_to, password, depth, budget)
+        else:
+            inner_kind = "zip" if kind == "zip" else archive_kind(base)
+            if inner_kind is None:
+                return "unsupported"
+            with VolumeReader(paths) as stream:
+                expand_archive(stream, inner_kind, extract_to, password, depth, budget)
+        logger.info(
+            f"Extraction successful ({budget['files']:,} files, {budget['bytes']:,} bytes)"
+        )
+        return "success"
+    except Exception as e:
+        msg = str(e).lower()
+        logger.error(f"Extraction failed: {e}")
+        if "password" in msg or "wrong" in msg:
+            return "password_required"
+        return str(e)
+
+
 # ============================= PROGRESS =============================
 async def update_progress(
-    msg, cur: int, total: int, action: str = "Processing", user_id: int = None
+    msg,
+    cur: int,
+    total: int,
+    action: str = "Processing",
+    user_id: int = None,
+    unit: str = "files",
 ) -> None:
     """Progress updater with cancel check"""
     try:
@@ -183,56 +742,755 @@ async def update_progress(
         bar = "█" * int(20 * cur / total) + "░" * (20 - int(20 * cur / total))
         perc = cur / total * 100
         await msg.edit(
-            f"**{action}**\n\n`{bar}` {perc:.1f}%\n{cur:,} / {total:,} files",
+            f"**{action}**\n\n`{bar}` {perc:.1f}%\n{cur:,} / {total:,} {unit}",
             buttons=[[Button.inline("❌ Cancel", b"cancel")]],
         )
     except Exception:
         pass
 
 
+# ============================= TRANSFERS =============================
+TARGET_TRANSFER_SECONDS = 10  # Don't open more connections than needed to hit this
+MIN_PARTS_PER_CONNECTION = 4
+transfer_stats = {"per_connection_bps": 0.0}  # Moving average of recent transfers
+idle_senders: dict[tuple[int, int], list] = {}  # (client, dc) -> connected senders
+
+
+class ReusableTransferrer(ParallelTransferrer):
+    """FastTelethon transferrer that keeps its connections for the next file"""
+
+    def __init__(self, client: TelegramClient, dc_id: int | None = None):
+        super().__init__(client, dc_id)
+        self.idle = idle_senders.setdefault((id(client), self.dc_id), [])
+
+    async def _create_sender(self):
+        while self.idle:
+            sender = self.idle.pop()
+            if sender.is_connected():
+                # On a foreign DC the senders created next need the key of this one,
+                # otherwise each does its own key exchange and authorization export
+                self.auth_key = self.auth_key or sender.auth_key
+                return sender
+        return await super()._create_sender()
+
+    async def _cleanup(self) -> None:
+        for sender in self.senders:
+            if getattr(sender, "previous", None):
+                await sender.previous  # Last part of an upload still in flight
+        self.idle.extend(sender.sender for sender in self.senders)
+        self.senders = None
+
+    async def abort(self) -> None:
+        if self.senders:
+            await asyncio.gather(
+                *[sender.disconnect() for sender in self.senders], return_exceptions=True
+            )
+            self.senders = None
+
+
+def plan_transfer(size: int) -> tuple[int, int]:
+    """(part size in KB, connection count) for a file, using measured throughput"""
+    if size >= 64 * 1024**2:
+        part_kb = 512  # Largest part Telegram accepts, keeps 2 GB under the part limit
+    elif size >= 8 * 1024**2:
+        part_kb = 256
+    else:
+        part_kb = 128
+    parts = max(1, math.ceil(size / (part_kb * 1024)))
+    connections = min(MAX_CONNECTIONS, math.ceil(parts / MIN_PARTS_PER_CONNECTION))
+    rate = transfer_stats["per_connection_bps"]
+    if rate:
+        connections = min(
+            connections, math.ceil(size / (rate * TARGET_TRANSFER_SECONDS))
+        )
+    return part_kb, max(1, connections)
+
+
+def _record_throughput(
+    size: int, connections: int, elapsed: float, phase: str
+) -> None:
+    observe("phase_seconds", elapsed, phase)
+    inc("bytes_total", size, phase)
+    inc("files_total", 1, phase)
+    if size < 1024**2 or elapsed <= 0:
+        return  # Tiny files only measure round trips
+    rate = size / elapsed / connections
+    old = transfer_stats["per_connection_bps"]
+    transfer_stats["per_connection_bps"] = 0.7 * old + 0.3 * rate if old else rate
+
+
+async def transfer_download(
+    client: TelegramClient, message, path: str, progress_callback=None
+) -> str:
+    """Parallel download of a message's document to path"""
+    size = message.document.size
+    dc_id, location = utils.get_input_location(message.document)
+    part_kb, connections = plan_transfer(size)
+    downloader = ReusableTransferrer(client, dc_id)
+    started = time.monotonic()
+    try:
+        with open(path, "wb") as out:
+            async for chunk in downloader.download(location, size, part_kb, connections):
+                out.write(chunk)
+                if progress_callback:
+                    await progress_callback(out.tell(), size)
+    except BaseException:
+        await downloader.abort()
+        raise
+    _record_throughput(size, connections, time.monotonic() - started, "download")
+    return path
+
+
+async def transfer_upload(client: TelegramClient, path: str):
+    """Parallel upload of a local file, returns the InputFile to send"""
+    size = os.path.getsize(path)
+    part_kb, connections = plan_transfer(size)
+    uploader = ReusableTransferrer(client)
+    file_id = helpers.generate_random_long()
+    started = time.monotonic()
+    try:
+        part_size, part_count, is_large = await uploader.init_upload(
+            file_id, size, part_kb, connections
+        )
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            while part := f.read(part_size):
+                if not is_large:
+                    md5.update(part)
+                await uploader.upload(part)
+        await uploader.finish_upload()
+    except BaseException:
+        await uploader.abort()
+        raise
+    _record_throughput(size, connections, time.monotonic() - started, "upload")
+    name = os.path.basename(path)
+    if is_large:
+        return InputFileBig(file_id, part_count, name)
+    return InputFile(file_id, part_count, name, md5.hexdigest())
+
+
+async def release_connections() -> None:
+    """Disconnect the connections kept between the transfers of a job"""
+    senders = [sender for pool in idle_senders.values() for sender in pool]
+    for pool in idle_senders.values():
+        pool.clear()
+    await asyncio.gather(*[s.disconnect() for s in senders], return_exceptions=True)
+
+
+# ============================= UPLOAD POOL =============================
+upload_pool: list[dict] = []  # {"client", "name", "busy", "flood_until"}
+parked_messages: list[tuple] = []  # (session client, message id) in STORAGE_CHAT
+
+
+def storage_chat() -> int | str:
+    return int(STORAGE_CHAT) if STORAGE_CHAT.lstrip("-").isdigit() else STORAGE_CHAT
+
+
+async def start_upload_pool() -> None:
+    """Connect the extra upload sessions; the primary client is always part of the pool"""
+    upload_pool.append({"client": client, "name": "primary", "busy": 0, "flood_until": 0.0})
+    if UPLOAD_SESSIONS and not STORAGE_CHAT:
+        logger.warning("UPLOAD_SESSIONS needs STORAGE_CHAT - uploading with primary only")
+        return
+    if UPLOAD_SESSIONS:
+        try:
+            await client.get_entity(storage_chat())  # The bot reads parked files there
+        except Exception as e:
+            logger.error(f"Bot can't access STORAGE_CHAT - uploading with primary only: {e}")
+            return
+    for i, session in enumerate(UPLOAD_SESSIONS, 1):
+        helper = TelegramClient(StringSession(session.strip()), API_ID, API_HASH)
+        try:
+            await helper.connect()
+            if not await helper.is_user_authorized():
+                raise RuntimeError("session is not logged in")
+            await helper.get_entity(storage_chat())
+        except Exception as e:
+            logger.error(f"Upload session #{i} disabled: {e}")
+            await helper.disconnect()
+            continue
+        upload_pool.append({"client": helper, "name": f"#{i}", "busy": 0, "flood_until": 0.0})
+    logger.info(f"{c.C}Upload pool ready ({len(upload_pool)} sessions){c.E}")
+
+
+async def _pick_session() -> dict:
+    """Least busy session that is not in FloodWait, waiting if all of them are"""
+    while True:
+        now = time.monotonic()
+        ready = [s for s in upload_pool if s["flood_until"] <= now]
+        if ready:
+            return min(ready, key=lambda s: s["busy"])
+        await asyncio.sleep(min(s["flood_until"] for s in upload_pool) - now)
+
+
+async def upload_file(path: str, mime: str, attributes: list | None = None):
+    """Upload on the pool and return media the primary client can send"""
+    while True:
+        session = await _pick_session()
+        session["busy"] += 1
+        try:
+            uploaded = await transfer_upload(session["client"], path)
+            media = (
+                InputMediaUploadedDocument(
+                    file=uploaded, mime_type=mime, attributes=attributes
+                )
+                if attributes
+                else uploaded
+            )
+            if session["client"] is client:
+                return media
+            # Uploads belong to the account that made them: park the file in the
+            # storage chat and hand the primary its own reference to that message
+            parked = await session["client"].send_file(storage_chat(), media)
+            parked_messages.append((session["client"], parked.id))
+            return (await client.get_messages(storage_chat(), ids=parked.id)).media
+        except FloodWaitError as e:
+            session["flood_until"] = time.monotonic() + e.seconds
+            inc("floodwait_seconds_total", e.seconds)
+            logger.warning(f"FloodWait {e.seconds}s on upload session {session['name']}")
+        finally:
+            session["busy"] -= 1
+
+
+async def clear_parked() -> None:
+    """Delete the job's files from STORAGE_CHAT once the primary has sent them"""
+    by_session = defaultdict(list)
+    for helper, message_id in parked_messages:
+        by_session[helper].append(message_id)
+    parked_messages.clear()
+    for helper, ids in by_session.items():
+        try:
+            await helper.delete_messages(storage_chat(), ids)
+        except Exception as e:
+            logger.warning(f"Could not delete {len(ids)} parked files: {e}")
+
+
 # ============================= QUEUE WORKER =============================
+def skip_if_cancelled(task_data: dict) -> bool:
+    """Drop a queued task whose user cancelled it while it waited"""
+    user_id = task_data["user_id"]
+    if user_id not in cancelled_users:
+        return False
+    logger.info(f"Skipping cancelled task for user {user_id}")
+    queue_list[:] = [q for q in queue_list if q["user_id"] != user_id]
+    cancelled_users.discard(user_id)
+    if "volumes" in task_data:
+        discard_volumes(task_data["volumes"])
+    return True
+
+
+async def run_job(task_data: dict) -> None:
+    """Run one task to the end and clean up after it, whatever happens"""
+    global is_processing, current_user, current_archive
+    user_id = task_data["user_id"]
+
+    is_processing = True
+    current_user = user_id
+    current_archive = task_data["event"].file.name
+    user_in_queue.discard(user_id)
+
+    # Store task reference
+    user_task_data[user_id] = task_data
+    observe("queue_wait_seconds", time.monotonic() - task_data["queued_at"])
+    job_started = time.monotonic()
+
+    try:
+        await process_archive(task_data)
+    except Exception as e:
+        logger.error(f"Queue worker error: {e}")
+        try:
+            await task_data["status"].edit(f"❌ Error: {str(e)}")
+        except:
+            pass
+    finally:
+        # Cleanup
+        queue_list[:] = [q for q in queue_list if q["user_id"] != user_id]
+        is_processing = False
+        current_user = None
+        current_archive = None
+        user_task_data.pop(user_id, None)
+        if "volumes" in task_data:
+            discard_volumes(task_data["volumes"])
+        await release_connections()
+        await clear_parked()
+        observe("job_seconds", time.monotonic() - job_started)
+        inc("jobs_total")
+        # Early returns in process_archive leave these set; a leftover flag
+        # would send the next /cancel to the "active task" branch
+        pending_tasks.pop(user_id, None)
+        cancelled_at = cancel_requested.pop(user_id, None)
+        if cancelled_at is not None:
+            # From the cancel press until the job actually stopped
+            observe("cancel_latency_seconds", time.monotonic() - cancelled_at)
+
+
 async def queue_worker():
     """Process one task at a time from the queue"""
-    global is_processing, current_user, current_archive, user_in_queue, cancelled_users
+    while True:
+        task_data = await task_queue.get()
+        if not skip_if_cancelled(task_data):
+            await run_job(task_data)
+        task_queue.task_done()
+
+
+# ============================= JOB BROKER =============================
+FINISHED_JOB_TTL = 24 * 3600  # Finished jobs the front end didn't delete itself
+
+
+def _without_password(payload: dict) -> str:
+    """Payload as stored once a worker holds the password"""
+    return json.dumps({**payload, "password": None})
+
+
+class SqliteBroker:
+    """Job table in a SQLite file shared by the front end and local workers"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._db()) as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "payload TEXT, state TEXT, worker TEXT, progress TEXT, "
+                "cancellable INTEGER DEFAULT 0, cancel INTEGER DEFAULT 0, updated REAL)"
+            )
 
+    def _db(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def publish(self, payload: dict) -> str:
+        with closing(self._db()) as db:
+            db.execute(
+                "DELETE FROM jobs WHERE state != 'queued' AND updated < ?",
+                (time.time() - FINISHED_JOB_TTL,),
+            )
+            cur = db.execute(
+                "INSERT INTO jobs (payload, state, progress, updated) VALUES (?, 'queued', '', ?)",
+                (json.dumps(payload), time.time()),
+            )
+            return str(cur.lastrowid)
+
+    def claim(self, worker: str) -> tuple[str, dict] | None:
+        with closing(self._db()) as db:
+            db.execute("BEGIN IMMEDIATE")  # One claimer at a time
+            row = db.execute(
+                "SELECT id, payload FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row:
+                db.execute(
+                    "UPDATE jobs SET state = 'running', worker = ?, updated = ?, "
+                    "payload = ? WHERE id = ?",
+                    (
+                        worker,
+                        time.time(),
+                        _without_password(json.loads(row["payload"])),
+                        row["id"],
+                    ),
+                )
+            db.execute("COMMIT")
+        return (str(row["id"]), json.loads(row["payload"])) if row else None
+
+    def report(
+        self,
+        job_id: str,
+        progress: str | None = None,
+        cancellable: bool = False,
+        state: str | None = None,
+    ) -> None:
+        """Store the worker's status text and/or state, also acts as heartbeat"""
+        with closing(self._db()) as db:
+            db.execute(
+                "UPDATE jobs SET progress = COALESCE(?, progress), "
+                "cancellable = CASE WHEN ? IS NULL THEN cancellable ELSE ? END, "
+                "state = COALESCE(?, state), updated = ? WHERE id = ?",
+                (progress, progress, int(cancellable), state, time.time(), job_id),
+            )
+
+    def cancel(self, job_id: str) -> None:
+        with closing(self._db()) as db:
+            db.execute(
+                "UPDATE jobs SET cancel = 1, "
+                "state = CASE state WHEN 'queued' THEN 'cancelled' ELSE state END "
+                "WHERE id = ?",
+                (job_id,),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with closing(self._db()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, job_id: str) -> None:
+        with closing(self._db()) as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+class RedisBroker:
+    """Same jobs in any Redis-protocol server (Redis, Valkey, KeyDB, Dragonfly)"""
+
+    def __init__(self, url: str):
+        import redis
+
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.r.ping()
+
+    def publish(self, payload: dict) -> str:
+        job_id = str(self.r.incr("unzipbot:next_id"))
+        self.r.hset(
+            f"unzipbot:job:{job_id}",
+            mapping={
+                "payload": json.dumps(payload),
+                "state": "queued",
+                "progress": "",
+                "cancellable": 0,
+                "cancel": 0,
+                "updated": time.time(),
+            },
+        )
+        self.r.rpush("unzipbot:queue", job_id)
+        return job_id
+
+    def claim(self, worker: str) -> tuple[str, dict] | None:
+        while job_id := self.r.lpop("unzipbot:queue"):  # LPOP is atomic
+            job = self.r.hgetall(f"unzipbot:job:{job_id}")
+            if job.get("state") != "queued":
+                continue  # Cancelled while waiting
+            payload = json.loads(job["payload"])
+            self.r.hset(
+                f"unzipbot:job:{job_id}",
+                mapping={
+                    "state": "running",
+                    "worker": worker,
+                    "updated": time.time(),
+                    "payload": _without_password(payload),
+                },
+            )
+            return job_id, payload
+        return None
+
+    def report(
+        self,
+        job_id: str,
+        progress: str | None = None,
+        cancellable: bool = False,
+        state: str | None = None,
+    ) -> None:
+        fields = {"updated": time.time()}
+        if progress is not None:
+            fields.update(progress=progress, cancellable=int(cancellable))
+        if state:
+            fields["state"] = state
+        key = f"unzipbot:job:{job_id}"
+        if not self.r.exists(key):
+            return  # Deleted by the front end, don't recreate it
+        self.r.hset(key, mapping=fields)
+        if state == "done":
+            self.r.expire(key, FINISHED_JOB_TTL)
+
+    def cancel(self, job_id: str) -> None:
+        key = f"unzipbot:job:{job_id}"
+        if not self.r.exists(key):
+            return
+        self.r.hset(key, "cancel", 1)
+        if self.r.hget(key, "state") == "queued":
+            self.r.hset(key, "state", "cancelled")
+            self.r.expire(key, FINISHED_JOB_TTL)
+
+    def get(self, job_id: str) -> dict | None:
+        job = self.r.hgetall(f"unzipbot:job:{job_id}")
+        if not job:
+            return None
+        for field in ("cancellable", "cancel"):
+            job[field] = int(job.get(field, 0))
+        job["updated"] = float(job.get("updated", 0))
+        return job
+
+    def delete(self, job_id: str) -> None:
+        self.r.delete(f"unzipbot:job:{job_id}")
+
+
+def open_broker(url: str):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisBroker(url)
+    if url.startswith("sqlite:///"):
+        return SqliteBroker(url[len("sqlite:///") :])
+    raise ValueError(f"Unsupported BROKER_URL: {url}")
+
+
+# ============================= WORKER MODE =============================
+broker = None  # Set in main() unless BOT_MODE is "all"
+remote_jobs: dict[str, dict] = {}  # Front end: published job id -> task data
+
+
+async def job_payload(task_data: dict) -> dict:
+    """What a worker needs to redo the task with its own session"""
+    event = task_data["event"]
+    user_id = task_data["user_id"]
+    password = user_passwords.get(user_id)
+    # With the access hash a fresh worker session can reach the chat
+    peer = (await event.get_input_chat()).to_dict()
+    payload = {
+        "peer": peer,
+        "message_id": event.message.id,
+        "user_id": user_id,
+        "password": password.decode() if password else None,
+        "published": time.time(),
+        "volumes": None,
+    }
+    volumes = task_data.get("volumes")
+    if volumes:
+        payload["volumes"] = {
+            "base": volumes["base"],
+            "kind": volumes["kind"],
+            "messages": {str(i): e.message.id for i, e in volumes["events"].items()},
+        }
+    return payload
+
+
+async def broker_retry(method, *args, attempts: int = 4):
+    """Call a broker method off the loop, retrying through short outages"""
+    for attempt in range(attempts):
+        try:
+            return await asyncio.to_thread(method, *args)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            logger.warning(f"Broker {method.__name__} failed, retrying: {e}")
+            await asyncio.sleep(2**attempt)
+
+
+async def dispatch_worker():
+    """Front end: hand queued tasks to the broker instead of running them"""
     while True:
         task_data = await task_queue.get()
-        user_id = task_data["user_id"]
-
-        # Check cancelled_users set before starting
-        if user_id in cancelled_users:
-            logger.info(f"Skipping cancelled task for user {user_id}")
-            queue_list[:] = [q for q in queue_list if q["user_id"] != user_id]
-            cancelled_users.discard(user_id)
-            task_queue.task_done()
+        if not skip_if_cancelled(task_data):
+            user_id = task_data["user_id"]
+            try:
+                job_id = await broker_retry(broker.publish, await job_payload(task_data))
+            except Exception as e:
+                logger.error(f"User {user_id} task could not be published: {e}")
+                queue_list[:] = [q for q in queue_list if q is not task_data]
+                user_in_queue.discard(user_id)
+                if "volumes" in task_data:
+                    discard_volumes(task_data["volumes"])
+                try:
+                    await task_data["status"].edit(
+                        "❌ Could not start processing, please send the file again"
+                    )
+                except Exception:
+                    pass
+                task_queue.task_done()
+                continue
+            remote_jobs[job_id] = task_data
+            pending_tasks[user_id] = False  # Lets the cancel buttons find it
+            user_task_data[user_id] = task_data
             user_in_queue.discard(user_id)
-            continue
+            logger.info(f"User {user_id} task published as job {job_id}")
+        task_queue.task_done()
+
+
+async def poll_remote_jobs():
+    """Front end: forward cancels to workers and mirror their progress"""
+    while True:
+        await asyncio.sleep(1)
+        for job_id, task_data in list(remote_jobs.items()):
+            user_id = task_data["user_id"]
+            try:
+                if pending_tasks.get(user_id) and not task_data.get("cancel_sent"):
+                    await asyncio.to_thread(broker.cancel, job_id)
+                    task_data["cancel_sent"] = True
+                job = await asyncio.to_thread(broker.get, job_id)
+            except Exception as e:
+                logger.warning(f"Broker unreachable for job {job_id}: {e}")
+                continue
+            if not job:
+                continue
+            if job["state"] != "queued":
+                queue_list[:] = [q for q in queue_list if q is not task_data]
+
+            text = job["progress"]
+            stale = (
+                job["state"] == "running"
+                and time.time() - job["updated"] > WORKER_TIMEOUT
+            )
+            if stale:
+                text = "❌ Worker stopped responding, please send the file again"
+            elif job["state"] == "cancelled" and not text:
+                text = "🛑 **Cancelled!**"
+            if text and text != task_data.get("shown"):
+                task_data["shown"] = text
+                buttons = (
+                    [[Button.inline("❌ Cancel", b"cancel")]]
+                    if job["cancellable"] and not stale
+                    else None
+                )
+                try:
+                    await task_data["status"].edit(text, buttons=buttons)
+                except Exception:
+                    pass
+
+            if job["state"] in {"done", "cancelled"} or stale:
+                remote_jobs.pop(job_id)
+                try:
+                    await asyncio.to_thread(broker.delete, job_id)
+                except Exception as e:
+                    logger.warning(f"Job {job_id} not deleted, it expires later: {e}")
+                if not any(t["user_id"] == user_id for t in remote_jobs.values()):
+                    pending_tasks.pop(user_id, None)
+                    user_task_data.pop(user_id, None)
+                    cancelled_at = cancel_requested.pop(user_id, None)
+                    if cancelled_at is not None:
+                        observe("cancel_latency_seconds", time.monotonic() - cancelled_at)
+                if "volumes" in task_data:
+                    discard_volumes(task_data["volumes"])
 
-        is_processing = True
-        current_user = user_id
-        current_archive = task_data["event"].file.name
-        user_in_queue.discard(user_id)
 
-        # Store task reference
-        user_task_data[user_id] = task_data
+class RemoteStatus:
+    """Worker side status message: edits are reported to the front end"""
 
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    async def edit(self, text: str, buttons=None, **kwargs) -> None:
         try:
-            await process_archive(task_data)
+            await asyncio.to_thread(broker.report, self.job_id, text, bool(buttons))
         except Exception as e:
-            logger.error(f"Queue worker error: {e}")
+            # Progress is best effort, a broker hiccup must not fail the job
+            logger.warning(f"Broker unreachable for job {self.job_id}: {e}")
+
+
+def _as_event(message, peer, user_id: int):
+    """Just enough of a NewMessage event for process_archive"""
+    return SimpleNamespace(
+        message=message,
+        file=message.file,
+        chat_id=peer,
+        sender_id=user_id,
+        reply=message.reply,
+    )
+
+
+async def load_remote_task(job_id: str, payload: dict) -> dict:
+    user_id = payload["user_id"]
+    fields = dict(payload["peer"])
+    peer = getattr(tl_types, fields.pop("_"))(**fields)
+    message = await client.get_messages(peer, ids=payload["message_id"])
+    if message is None or message.file is None:
+        raise RuntimeError("archive message is gone")
+    if payload["password"]:
+        user_passwords[user_id] = payload["password"].encode()
+
+    task_data = {
+        "event": _as_event(message, peer, user_id),
+        "status": RemoteStatus(job_id),
+        "user_id": user_id,
+        "cancelled": False,
+        # Queue wait counts from publishing, on whichever machine that was
+        "queued_at": time.monotonic() - (time.time() - payload["published"]),
+    }
+    volumes = payload["volumes"]
+    if volumes:
+        volume_set = {
+            "base": volumes["base"],
+            "kind": volumes["kind"],
+            "folder": f"downloads/volumes_{user_id}_job{job_id}",
+            "events": {},
+            "paths": {},
+            "downloads": {},
+            "status": task_data["status"],
+        }
+        os.makedirs(volume_set["folder"], exist_ok=True)
+        indexes = [int(i) for i in volumes["messages"]]
+        try:
+            messages = await client.get_messages(
+                peer, ids=[volumes["messages"][str(i)] for i in indexes]
+            )
+            for index, volume in zip(indexes, messages):
+                if volume is None:
+                    raise RuntimeError(f"volume {index} is gone")
+                start_volume_download(volume_set, index, _as_event(volume, peer, user_id))
+        except Exception:
+            discard_volumes(volume_set)
+            raise
+        task_data["volumes"] = volume_set
+    return task_data
+
+
+class JobHeartbeat(threading.Thread):
+    """Worker: heartbeat for the front end, and pick up its cancel requests
+
+    Runs on its own thread, so extraction or ffmpeg blocking the event loop
+    can't make a healthy job look dead to the front end.
+    """
+
+    def __init__(self, job_id: str, user_id: int):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.is_set():
             try:
-                await task_data["status"].edit(f"❌ Error: {str(e)}")
-            except:
-                pass
+                broker.report(self.job_id)
+                job = broker.get(self.job_id)
+            except Exception as e:
+                logger.warning(f"Broker unreachable for job {self.job_id}: {e}")
+                job = None
+            if job and job["cancel"]:
+                self.loop.call_soon_threadsafe(self._cancel)
+            self._done.wait(1)  # Also how quickly a cancel gets through
+
+    def _cancel(self) -> None:
+        if self._done.is_set() or pending_tasks.get(self.user_id):
+            return  # Job already over, or cancel already seen
+        pending_tasks[self.user_id] = True
+        cancel_requested.setdefault(self.user_id, time.monotonic())
+
+    def stop(self) -> None:
+        self._done.set()  # Not joined: a slow broker call must not block the loop
+
+
+async def finish_remote_job(job_id: str, progress: str | None = None) -> None:
+    """Worker: mark a job done; if that fails the front end times it out"""
+    try:
+        await broker_retry(broker.report, job_id, progress, False, "done")
+    except Exception as e:
+        logger.error(f"Job {job_id} could not be marked done: {e}")
+
+
+async def remote_worker():
+    """Worker: claim jobs from the broker and run them like the local queue"""
+    logger.info(f"{c.C}Worker {WORKER_ID} waiting for jobs{c.E}")
+    while True:
+        try:
+            claimed = await asyncio.to_thread(broker.claim, WORKER_ID)
+        except Exception as e:
+            logger.warning(f"Broker unreachable: {e}")
+            claimed = None
+        if not claimed:
+            await asyncio.sleep(1)
+            continue
+        job_id, payload = claimed
+        logger.info(f"Worker {WORKER_ID} claimed job {job_id}")
+        try:
+            task_data = await load_remote_task(job_id, payload)
+        except Exception as e:
+            logger.error(f"Job {job_id} could not be loaded: {e}")
+            await finish_remote_job(job_id, f"❌ Error: {e}")
+            continue
+
+        user_id = payload["user_id"]
+        heartbeat = JobHeartbeat(job_id, user_id)
+        heartbeat.start()
+        try:
+            await run_job(task_data)
         finally:
-            # Cleanup
-            queue_list[:] = [q for q in queue_list if q["user_id"] != user_id]
-            is_processing = False
-            current_user = None
-            current_archive = None
-            user_task_data.pop(user_id, None)
-            pending_tasks.pop(user_id, None)
-            task_queue.task_done()
+            heartbeat.stop()
+            user_passwords.pop(user_id, None)
+            await finish_remote_job(job_id)
 
 
 # ============================= PROCESS ARCHIVE (Main Logic) =============================
@@ -246,7 +1504,8 @@ async def process_archive(task_data):
     pending_tasks[user_id] = False
     active_uploads[user_id] = 0
 
-    archive_name = event.file.name
+    volumes = task_data.get("volumes")  # Set only for multi-volume archives
+    archive_name = volumes["base"] if volumes else event.file.name
     muted_videos = []
 
     # === DOWNLOAD PHASE ===
@@ -254,31 +1513,40 @@ async def process_archive(task_data):
         "⬇️ **Downloading...**", buttons=[[Button.inline("❌ Cancel", b"cancel")]]
     )
 
-    path = f"downloads/{event.file.name}"
-    os.makedirs("downloads", exist_ok=True)
+    if volumes:
+        # Volumes started downloading as they arrived, just wait for the rest
+        if not await wait_for_volumes(volumes, status, user_id):
+            return
+        path = volumes["paths"][min(volumes["paths"])]
+    else:
+        path = f"downloads/{event.file.name}"
+        os.makedirs("downloads", exist_ok=True)
 
-    # Proper async wrapper that FastTelethon can call
-    async def download_progress(current, total):
-        if is_cancelled(user_id):
-            raise asyncio.CancelledError("Download cancelled by user")
-        await update_progress(status, current, total, "Downloading", user_id)
-        return None  # Important: must return None or the progress continues
+        last_edit = 0.0
 
-    try:
-        await fast_download(
-            client,
-            event.message,
-            path,
-            progress_bar_function=download_progress,
-        )
-    except asyncio.CancelledError:
-        await status.edit("🛑 **Download cancelled!**")
-        if os.path.exists(path):
-            os.remove(path)
-        return
-    except Exception as e:
-        await status.edit(f"❌ Download failed: {str(e)}")
-        return
+        # Called for every part: cancel right away, edit the message every few seconds
+        async def download_progress(current, total):
+            nonlocal last_edit
+            if is_cancelled(user_id):
+                raise asyncio.CancelledError("Download cancelled by user")
+            if time.monotonic() - last_edit >= 3 or current == total:
+                last_edit = time.monotonic()
+                await update_progress(
+                    status, current, total, "Downloading", user_id, unit="bytes"
+                )
+
+        try:
+            await transfer_download(
+                client, event.message, path, progress_callback=download_progress
+            )
+        except asyncio.CancelledError:
+            await status.edit("🛑 **Download cancelled!**")
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        except Exception as e:
+            await status.edit(f"❌ Download failed: {str(e)}")
+            return
 
     # Check after download
     if is_cancelled(user_id):
@@ -302,7 +1570,15 @@ async def process_archive(task_data):
             os.remove(path)
         return
 
-    result = extract_archive(path, extract_to, user_passwords.get(user_id))
+    with timed("extract"):
+        if volumes:
+            result = extract_volumes(
+                volumes, extract_to, user_passwords.get(user_id), NESTED_DEPTH
+            )
+        else:
+            result = extract_archive(
+                path, extract_to, user_passwords.get(user_id), NESTED_DEPTH
+            )
 
     if result == "password_required":
         await status.edit("🔒 **Password required!**\nSend `/pass your_password`")
@@ -329,13 +1605,16 @@ async def process_archive(task_data):
 
     # === COLLECT FILES ===
     files = []
+    extracted_bytes = 0
     images_count = 0
     videos_count = 0
 
     for root, _, filenames in os.walk(extract_to):
         for filename in filenames:
             fp = os.path.join(root, filename)
-            if os.path.getsize(fp) > 2_000_000_000:
+            size = os.path.getsize(fp)
+            extracted_bytes += size
+            if size > 2_000_000_000:
                 logger.info(f"Skipping {filename} (>2GB)")
                 continue
 
@@ -369,6 +1648,9 @@ async def process_archive(task_data):
             elif mime.startswith("video/"):
                 videos_count += 1
 
+    inc("files_total", len(files), "extract")
+    inc("bytes_total", extracted_bytes, "extract")
+
     if not files:
         await status.edit("❌ No files found in archive")
         shutil.rmtree(extract_to, ignore_errors=True)
@@ -396,8 +1678,17 @@ async def process_archive(task_data):
 
     sent = 0
     media_group = []
+    uploads: dict[int, asyncio.Task] = {}
+
+    async def prepare_upload(file: dict) -> tuple:
+        attributes = None
+        if file["mime"].startswith("video/"):
+            add_silent_audio(file["path"], muted_videos)
+            attributes = video_attributes(file["path"])
+        # No per-part upload progress, it is updated per file below
+        return await upload_file(file["path"], file["mime"], attributes), attributes
 
-    for file in files:
+    for i, file in enumerate(files):
         # CRITICAL: Check cancel before EACH file
         if is_cancelled(user_id):
             await status.edit("🛑 **Upload cancelled!**")
@@ -406,13 +1697,13 @@ async def process_archive(task_data):
             )
             break
 
-        # Process video audio
-        if file["mime"].startswith("video/"):
-            add_silent_audio(file["path"], muted_videos)
+        # Keep one upload in flight per pool session, sending stays in order
+        for j in range(i, min(i + max(1, len(upload_pool)), len(files))):
+            if j not in uploads:
+                uploads[j] = asyncio.create_task(prepare_upload(files[j]))
 
-        # Use correct fast_upload without progress (FastTelethon doesn't support upload progress)
         try:
-            uploaded = await fast_upload(client, file["path"])
+            uploaded, attributes = await uploads.pop(i)
         except Exception as e:
             logger.error(f"Upload error for {file['name']}: {e}")
             continue
@@ -432,57 +1723,23 @@ async def process_archive(task_data):
 
         # Send file
         if file["mime"].startswith(("image/", "video/")):
-            if file["mime"].startswith("video/"):
-                try:
-                    meta = json.loads(
-                        subprocess.run(
-                            [
-                                "ffprobe",
-                                "-v",
-                                "error",
-                                "-select_streams",
-                                "v",
-                                "-show_entries",
-                                "stream=width,height,duration",
-                                "-of",
-                                "json",
-                                file["path"],
-                            ],
-                            capture_output=True,
-                            text=True,
-                        ).stdout
-                    )["streams"][0]
-
-                    media_group.append(
-                        InputMediaUploadedDocument(
-                            file=uploaded,
-                            mime_type=file["mime"],
-                            attributes=[
-                                DocumentAttributeVideo(
-                                    duration=int(float(meta.get("duration", 0))),
-                                    w=int(meta.get("width", 0)),
-                                    h=int(meta.get("height", 0)),
-                                    supports_streaming=True,
-                                )
-                            ],
-                        )
-                    )
-                except Exception as e:
-                    logger.error(f"Video metadata error for {file['name']}: {e}")
-                    # Fallback: send as regular file
+            if file["mime"].startswith("video/") and attributes is None:
+                # Fallback: send as regular file
+                with timed("send"):
                     await client.send_file(event.chat_id, uploaded, caption=caption)
-                    continue
-            else:
-                media_group.append(uploaded)
+                continue
+            media_group.append(uploaded)
         else:
-            await client.send_file(event.chat_id, uploaded, caption=caption)
+            with timed("send"):
+                await client.send_file(event.chat_id, uploaded, caption=caption)
 
         # Send media group if full
         if len(media_group) == 10:
             if is_cancelled(user_id):
                 break
             try:
-                await client.send_file(event.chat_id, media_group)
+                with timed("send"):
+                    await client.send_file(event.chat_id, media_group)
             except Exception as e:
                 logger.error(f"Failed to send media group: {e}")
             media_group = []
@@ -490,10 +1747,14 @@ async def process_archive(task_data):
         # Yield to event loop
         await asyncio.sleep(0.05)
 
+    for task in uploads.values():
+        task.cancel()
+
     # Send remaining media
     if media_group and not is_cancelled(user_id):
         try:
-            await client.send_file(event.chat_id, media_group)
+            with timed("send"):
+                await client.send_file(event.chat_id, media_group)
         except Exception as e:
             logger.error(f"Failed to send remaining media group: {e}")
 
@@ -575,7 +1836,8 @@ async def cb_status(e) -> None:
 async def cb_help(e) -> None:
     await e.reply(
         "**Help**\n• Send archive\n• Password: `/pass abc123`\n• Cancel anytime\n"
-        "• **Queue: Files processed one at a time**\n\n"
+        "• **Queue: Files processed one at a time**\n"
+        "• Split archives: send all parts, then press ✅\n\n"
         "Supported: ZIP RAR 7Z TAR\nMade by @hellopeter3"
     )
 
@@ -643,6 +1905,7 @@ async def cancel(e) -> None:
     # Cancel active task
     if user_id in pending_tasks or user_id == current_user:
         pending_tasks[user_id] = True
+        cancel_requested.setdefault(user_id, time.monotonic())
         await e.answer("🛑 Cancelling current task...", alert=True)
         logger.info(f"User {user_id} pressed cancel button")
         return
@@ -720,10 +1983,23 @@ async def cmd_cancel(e) -> None:
     # Cancel active processing task
     if user_id in pending_tasks or user_id == current_user:
         pending_tasks[user_id] = True
+        cancel_requested.setdefault(user_id, time.monotonic())
         await e.reply("🛑 **Cancelling current task...**")
         logger.info(f"User {user_id} used /cancel on active task")
         return
 
+    # Cancel a split archive that is still being collected
+    if user_id in volume_sets:
+        volume_set = volume_sets.pop(user_id)
+        discard_volumes(volume_set)
+        try:
+            await volume_set["status"].edit(f"❌ **Cancelled:** `{volume_set['base']}`")
+        except Exception:
+            pass
+        await e.reply(f"❌ **Cancelled:** `{volume_set['base']}`")
+        logger.info(f"User {user_id} cancelled volume collection")
+        return
+
     # Cancel queued tasks
     user_tasks = [q for q in queue_list if q["user_id"] == user_id]
     if not user_tasks:
@@ -763,6 +2039,58 @@ async def cmd_uptime(e) -> None:
     await e.reply(f"⏱ **Uptime:** {str(datetime.now() - start_time).split('.')[0]}")
 
 
+@client.on(events.NewMessage(pattern="/stats"))
+async def cmd_stats(e) -> None:
+    """Admin-only summary of the metrics"""
+    if e.sender_id not in ADMIN_IDS:
+        return
+
+    def seconds(name: str, phase: str = "") -> tuple[float, int]:
+        h = histograms.get((name, phase))
+        return (h["sum"], h["count"]) if h else (0.0, 0)
+
+    text = f"📈 **Stats** (jobs: {counters.get(('jobs_total', ''), 0):g})\n\n"
+    for phase in ("download", "extract", "probe", "ffmpeg", "upload", "send"):
+        total, count = seconds("phase_seconds", phase)
+        if not count:
+            continue
+        text += f"**{phase}:** {count}× · {total:.1f}s"
+        if counters.get(("bytes_total", phase)) and total:
+            text += f" · {counters[('bytes_total', phase)] / total / 1024**2:.2f} MB/s"
+        if counters.get(("files_total", phase)) and total:
+            text += f" · {counters[('files_total', phase)] / total:.1f} files/s"
+        text += "\n"
+    for label, name in (
+        ("Queue wait", "queue_wait_seconds"),
+        ("Cancel latency", "cancel_latency_seconds"),
+    ):
+        total, count = seconds(name)
+        if count:
+            text += f"\n**{label}:** avg {total / count:.1f}s ({count}×)"
+    text += f"\n**FloodWait:** {counters.get(('floodwait_seconds_total', ''), 0):g}s"
+    if METRICS_PORT:
+        text += f"\n\nMetrics: `http://{METRICS_HOST}:{METRICS_PORT}/metrics`"
+    await e.reply(text)
+
+
+@client.on(events.NewMessage(pattern="/profile"))
+async def cmd_profile(e) -> None:
+    """Admin-only: sample the event loop for N seconds and send the profile"""
+    if e.sender_id not in ADMIN_IDS:
+        return
+    parts = e.text.split()
+    seconds = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 10
+    seconds = min(max(seconds, 1), 300)
+    status = await e.reply(f"🔬 **Profiling for {seconds}s...**")
+    stacks = await asyncio.to_thread(sample_loop_stacks, seconds)
+    path = write_profile(stacks, seconds)
+    await status.delete()
+    await client.send_file(
+        e.chat_id, path, caption=f"🔬 Profile: {sum(stacks.values()):,} samples"
+    )
+    logger.info(f"Profile written to {path} for {e.sender_id}")
+
+
 @client.on(events.NewMessage(pattern="/pass"))
 async def set_pass(e) -> None:
     parts = e.text.split()
@@ -779,9 +2107,8 @@ async def set_pass(e) -> None:
     events.NewMessage(
         func=lambda e: e.file
         and e.file.name
-        and e.file.name.lower().endswith(
-            (".zip", ".rar", ".7z", ".tar", ".gz", ".tgz", ".bz2")
-        )
+        and e.file.name.lower().endswith(ARCHIVE_EXTS)
+        and not is_volume_message(e)
     )
 )
 async def handle_archive(event) -> None:
@@ -809,6 +2136,7 @@ async def handle_archive(event) -> None:
         "status": status,
         "user_id": user_id,
         "cancelled": False,  # Track per-task cancel
+        "queued_at": time.monotonic(),
     }
 
     queue_list.append(task_data)
@@ -819,13 +2147,234 @@ async def handle_archive(event) -> None:
     )
 
 
+# ============================= MULTI-VOLUME HANDLER (Collect Parts) =============================
+def is_volume_message(e) -> bool:
+    name = e.file and e.file.name
+    if not name:
+        return False
+    if volume_info(name):
+        return True
+    # The closing `.zip` of a `.z01` set looks like a normal archive
+    volume_set = volume_sets.get(e.sender_id)
+    return bool(
+        volume_set
+        and volume_set["kind"] == "zip"
+        and name.lower() == f"{volume_set['base']}.zip".lower()
+    )
+
+
+def missing_volumes(volume_set: dict) -> list[str]:
+    indexes = sorted(volume_set["events"])
+    missing = []
+    if volume_set["kind"] == "zip":
+        if indexes[-1] == LAST_VOLUME:
+            indexes.pop()
+        else:
+            missing.append(f"{volume_set['base']}.zip")
+    if indexes:
+        missing[:0] = [str(i) for i in range(1, indexes[-1]) if i not in indexes]
+    return missing
+
+
+def discard_volumes(volume_set: dict) -> None:
+    """Stop pending volume downloads and delete everything downloaded so far"""
+    for task in volume_set["downloads"].values():
+        task.cancel()
+    shutil.rmtree(volume_set["folder"], ignore_errors=True)
+
+
+async def wait_for_volumes(volume_set: dict, status, user_id: int) -> bool:
+    """Wait for the volumes still downloading, False if cancelled or failed"""
+    total = len(volume_set["downloads"])
+    pending = set(volume_set["downloads"].values())
+    while pending:
+        done, pending = await asyncio.wait(pending, timeout=1)
+        if is_cancelled(user_id):
+            await status.edit("🛑 **Download cancelled!**")
+            return False
+        for task in done:
+            if task.exception():
+                await status.edit(f"❌ Download failed: {task.exception()}")
+                return False
+        if done:
+            await update_progress(
+                status, total - len(pending), total, "Downloading volumes", user_id
+            )
+    return True
+
+
+volume_download_slots = asyncio.Semaphore(VOLUME_DOWNLOADS)
+
+
+async def _download_volume(event, path: str) -> str:
+    async with volume_download_slots:
+        return await transfer_download(client, event.message, path)
+
+
+def start_volume_download(volume_set: dict, index: int, event) -> None:
+    # Keep original names: unrar looks for the next .partN.rar next to the first
+    path = os.path.join(volume_set["folder"], event.file.name)
+    volume_set["events"][index] = event
+    volume_set["paths"][index] = path
+    volume_set["downloads"][index] = asyncio.create_task(_download_volume(event, path))
+
+
+async def expire_volumes(user_id: int, volume_set: dict) -> None:
+    """Discard a split archive that got no new part for VOLUME_IDLE_TIMEOUT"""
+    while volume_sets.get(user_id) is volume_set:
+        idle = time.monotonic() - volume_set["last_part"]
+        if idle < VOLUME_IDLE_TIMEOUT:
+            await asyncio.sleep(VOLUME_IDLE_TIMEOUT - idle)
+            continue
+        volume_sets.pop(user_id)
+        discard_volumes(volume_set)
+        logger.info(f"User {user_id} volume set {volume_set['base']} expired")
+        try:
+            await volume_set["status"].edit(
+                f"⌛ **Expired:** `{volume_set['base']}`\nNo new part for "
+                f"{VOLUME_IDLE_TIMEOUT // 60} minutes, please send all parts again."
+            )
+        except Exception:
+            pass
+
+
+@client.on(events.NewMessage(func=is_volume_message))
+async def handle_volume(event) -> None:
+    """Collect the parts of a split archive, downloading each one right away"""
+    user_id = event.sender_id
+    name = event.file.name
+    base, kind, index = volume_info(name) or (name[:-4], "zip", LAST_VOLUME)
+
+    volume_set = volume_sets.get(user_id)
+    if volume_set and (volume_set["base"], volume_set["kind"]) != (base, kind):
+        await event.reply(
+            f"⚠️ Still collecting `{volume_set['base']}`. Finish or /cancel it first."
+        )
+        return
+    if not volume_set:
+        volume_set = volume_sets[user_id] = {
+            "base": base,
+            "kind": kind,
+            "folder": f"downloads/volumes_{user_id}_{event.id}",
+            "events": {},
+            "paths": {},
+            "downloads": {},
+            "status": None,
+            "last_part": time.monotonic(),
+        }
+        os.makedirs(volume_set["folder"], exist_ok=True)
+        asyncio.create_task(expire_volumes(user_id, volume_set))
+    if index in volume_set["events"]:
+        await event.reply(f"⚠️ `{name}` was already received.")
+        return
+
+    first = not volume_set["events"]
+    volume_set["last_part"] = time.monotonic()
+    if BOT_MODE == "frontend":
+        volume_set["events"][index] = event  # A worker downloads them
+    else:
+        start_volume_download(volume_set, index, event)
+    logger.info(f"User {user_id} sent volume {name} ({len(volume_set['events'])} so far)")
+
+    text = (
+        f"🧩 **Collecting `{base}`**\n**Parts received:** {len(volume_set['events'])}\n\n"
+        "Send the remaining parts, then press ✅"
+    )
+    buttons = [
+        [
+            Button.inline("✅ All parts sent", b"volumes_done"),
+            Button.inline("❌ Cancel", b"volumes_cancel"),
+        ]
+    ]
+    try:
+        if first:
+            volume_set["status"] = await event.reply(text, buttons=buttons)
+        elif volume_set["status"]:
+            await volume_set["status"].edit(text, buttons=buttons)
+    except Exception:
+        pass
+
+
+@client.on(events.CallbackQuery(data=b"volumes_done"))
+async def volumes_done(e) -> None:
+    """Queue a complete split archive like any other archive"""
+    user_id = e.sender_id
+    volume_set = volume_sets.get(user_id)
+    if not volume_set:
+        await e.answer("No split archive being collected.", alert=True)
+        return
+
+    missing = missing_volumes(volume_set)
+    if missing:
+        await e.answer(f"⚠️ Missing parts: {', '.join(missing)}", alert=True)
+        return
+    if user_id in user_in_queue:
+        await e.answer("⚠️ You already have a file in queue! Please wait.", alert=True)
+        return
+
+    volume_sets.pop(user_id)
+    queue_position = len(queue_list) + (1 if is_processing else 0)
+    status = volume_set["status"]
+    await status.edit(
+        f"📥 **Added to queue**\n**Parts:** {len(volume_set['events'])}\n"
+        f"**Position:** {queue_position}\n\nProcessing 1 file at a time. Please wait..."
+    )
+
+    task_data = {
+        "event": volume_set["events"][min(volume_set["events"])],
+        "status": status,
+        "user_id": user_id,
+        "cancelled": False,
+        "queued_at": time.monotonic(),
+        "volumes": volume_set,
+    }
+    queue_list.append(task_data)
+    user_in_queue.add(user_id)
+    await task_queue.put(task_data)
+    logger.info(
+        f"User {user_id} added to queue (position: {queue_position}, "
+        f"volumes: {len(volume_set['events'])} of {volume_set['base']})"
+    )
+
+
+@client.on(events.CallbackQuery(data=b"volumes_cancel"))
+async def volumes_cancel(e) -> None:
+    volume_set = volume_sets.pop(e.sender_id, None)
+    if not volume_set:
+        await e.answer("No split archive being collected.", alert=True)
+        return
+    discard_volumes(volume_set)
+    await e.edit(f"❌ **Cancelled:** `{volume_set['base']}`")
+    await e.answer("🛑 Split archive cancelled!", alert=True)
+    logger.info(f"User {e.sender_id} cancelled volume collection")
+
+
 # ============================= START =============================
 async def main() -> None:
+    global broker
+    if BOT_MODE != "all":
+        broker = open_broker(BROKER_URL)
+        logger.info(f"{c.C}Mode: {BOT_MODE}, broker: {BROKER_URL.split('@')[-1]}{c.E}")
     await client.start(bot_token=BOT_TOKEN)
-
-    # Start queue worker
-    asyncio.create_task(queue_worker())
-    logger.info(f"{c.C}Queue worker started{c.E}")
+    if BOT_MODE != "frontend":
+        await start_upload_pool()
+    start_loop_monitor()
+    if METRICS_PORT:
+        await asyncio.start_server(
+            serve_metrics, METRICS_HOST, METRICS_PORT
+        )
+        logger.info(f"{c.C}Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics{c.E}")
+
+    if BOT_MODE == "worker":
+        asyncio.create_task(remote_worker())
+    elif BOT_MODE == "frontend":
+        asyncio.create_task(dispatch_worker())
+        asyncio.create_task(poll_remote_jobs())
+        logger.info(f"{c.C}Dispatching jobs to workers{c.E}")
+    else:
+        # Start queue worker
+        asyncio.create_task(queue_worker())
+        logger.info(f"{c.C}Queue worker started{c.E}")
 
     print(f"{c.G}BOT BY @{DEVELOPER} IS 100% READY & ONLINE!{c.E}")
     await client.run_until_disconnected()